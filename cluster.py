@@ -0,0 +1,253 @@
+"""Exécution multi-machines des simulations : coordinateur + workers.
+
+Protocole : TCP, un message JSON par ligne.
+    worker -> coord : {"type": "hello", "pid": ..., "token": DND_CLUSTER_TOKEN}
+    coord -> worker : {"type": "rejected", "reason": "..."}                  (token invalide, puis fermeture)
+    coord -> worker : {"type": "job", "job": j, "args": [pj, mon, actions]}   (une fois par job et par connexion)
+    coord -> worker : {"type": "forget", "job": j}                            (job terminé)
+    coord -> worker : {"type": "chunk", "job": j, "chunk": i, "seed": s, "n": n}   (PIPELINE en vol)
+    worker -> coord : {"type": "result", "job": j, "chunk": i, "result": {agrégat partiel}}
+                    | {"type": "error", "job": j, "chunk": i, "error": "..."}
+
+Lancer un worker (un par cœur) :
+    DND_CLUSTER_TOKEN=... python -m cluster worker --connect host:9100 [--procs 4]
+"""
+import os, sys, hmac, json, time, queue, socket, argparse, threading
+from collections import Counter
+from itertools import count
+from simulation import run_chunk
+
+CHUNK_TIMEOUT = 300.0  # Un worker muet plus longtemps est considéré comme mort
+JOB_TIMEOUT = 3600.0   # Au-delà, les chunks restants sont rendus au poste local
+MAX_TRIES = 3          # Connexions perdues tolérées pour un même chunk
+PIPELINE = 2           # Chunks en vol par connexion (masque l'aller-retour réseau)
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+class ChunkError(RuntimeError):
+    """Un chunk a échoué (erreur de calcul, pas de connexion)"""
+
+class WorkerRejected(RuntimeError):
+    """Le coordinateur a refusé ce worker (token invalide)"""
+
+def send_msg(f, msg):
+    f.write(json.dumps(msg).encode() + b"\n"); f.flush()
+
+def recv_msg(f):
+    line = f.readline()
+    if not line: raise ConnectionError("Connexion fermée")
+    return json.loads(line)
+
+class Coordinator:
+    """Distribue les chunks des simulations en cours à partir d'une file commune.
+    Consommateurs : les workers distants (PIPELINE chunks en vol chacun) et, pendant un run,
+    les cœurs locaux du serveur. Plusieurs simulations peuvent tourner en même temps.
+    Un chunk perdu (worker mort, timeout) est remis dans la file, au plus MAX_TRIES fois ;
+    une erreur de calcul fait échouer la simulation immédiatement (ChunkError)."""
+
+    def __init__(self, host="127.0.0.1", port=9100, token=None, chunk_timeout=CHUNK_TIMEOUT, job_timeout=JOB_TIMEOUT):
+        token = token if token is not None else os.environ.get("DND_CLUSTER_TOKEN", "")
+        if not token and host not in LOCAL_HOSTS:
+            raise ValueError("DND_CLUSTER_TOKEN requis pour écouter hors de localhost")
+        self.token = token.encode()
+        self.sock = socket.create_server((host, port))
+        self.address = self.sock.getsockname()
+        self.chunk_timeout = chunk_timeout
+        self.job_timeout = job_timeout
+        self.tasks = queue.Queue()
+        self.jobs = {}  # job -> {"args": ..., "results": Queue}
+        self.workers = 0
+        self.requeued = 0
+        self.completed = Counter()  # pid du worker (ou "local") -> chunks traités
+        self.lock = threading.Lock()
+        self.job_ids = count(1)
+        self.closed = False
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while not self.closed:
+            try: conn, _ = self.sock.accept()
+            except OSError: break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _route(self, job, idx, kind, res, who=None):
+        if kind == "result":
+            with self.lock: self.completed[who] += 1
+        j = self.jobs.get(job)
+        if j: j["results"].put((idx, kind, res))
+
+    def _requeue(self, task):
+        # Re-dispatch vers un autre consommateur, mais pas indéfiniment
+        task["tries"] = task.get("tries", 0) + 1
+        if task["tries"] < MAX_TRIES:
+            with self.lock: self.requeued += 1
+            self.tasks.put(task)
+        else: self._route(task["job"], task["chunk"], "lost", None)
+
+    def _serve(self, conn):
+        conn.settimeout(self.chunk_timeout)
+        f = conn.makefile("rwb")
+        try:
+            hello = recv_msg(f)
+            if hello.get("type") != "hello" or not hmac.compare_digest(str(hello.get("token", "")).encode(), self.token):
+                send_msg(f, {"type": "rejected", "reason": "token invalide"})
+                conn.close(); return
+        except (OSError, ValueError):
+            conn.close(); return
+        pid = hello.get("pid")
+        with self.lock: self.workers += 1
+        inflight, sent_jobs, stopping = {}, set(), False
+        try:
+            while not (stopping and not inflight):
+                # Remplit le pipeline : bloquant seulement si rien n'est en vol
+                while not stopping and len(inflight) < PIPELINE:
+                    try: task = self.tasks.get(block=not inflight)
+                    except queue.Empty: break
+                    if task is None: stopping = True; break
+                    job = self.jobs.get(task["job"])
+                    if job is None: continue  # Job déjà terminé
+                    inflight[(task["job"], task["chunk"])] = task
+                    for old in sent_jobs - self.jobs.keys():
+                        send_msg(f, {"type": "forget", "job": old}); sent_jobs.discard(old)
+                    if task["job"] not in sent_jobs:
+                        send_msg(f, {"type": "job", "job": task["job"], "args": job["args"]}); sent_jobs.add(task["job"])
+                    send_msg(f, task)
+                if not inflight: continue
+                reply = recv_msg(f)
+                if inflight.pop((reply["job"], reply["chunk"]), None) is None: continue
+                if reply.get("type") == "error": self._route(reply["job"], reply["chunk"], "error", reply.get("error"))
+                else: self._route(reply["job"], reply["chunk"], "result", reply["result"], pid)
+        except (OSError, ValueError, KeyError):
+            for task in inflight.values(): self._requeue(task)
+        finally:
+            with self.lock: self.workers -= 1
+            conn.close()
+
+    def _local(self, executor, active):
+        """Consommateur local : exécute des chunks de la file sur le ProcessPool du serveur"""
+        while active.is_set():
+            try: task = self.tasks.get(timeout=0.2)
+            except queue.Empty: continue
+            if task is None: self.tasks.put(None); return
+            job = self.jobs.get(task["job"])
+            if job is None: continue
+            try: fut = executor.submit(run_chunk, ((task["chunk"], task["seed"], task["n"]), job["args"]))
+            except RuntimeError:
+                self.tasks.put(task); return  # Pool déjà fermé : un autre consommateur s'en charge
+            try: self._route(task["job"], task["chunk"], "result", fut.result(), "local")
+            except Exception as e: self._route(task["job"], task["chunk"], "error", f"{type(e).__name__}: {e}")
+
+    def live_workers(self):
+        with self.lock: return self.workers
+
+    def run(self, chunks, args, executor=None, local_slots=0):
+        """Exécute les chunks [(idx, seed, n), ...] sur les workers et, si `executor` est fourni,
+        sur `local_slots` cœurs locaux en parallèle.
+        Renvoie {idx: agrégat partiel} ; les chunks absents (plus de consommateur, trop de pertes,
+        délai JOB_TIMEOUT dépassé) sont à traiter localement. Lève ChunkError si un chunk échoue."""
+        local_slots = local_slots if executor else 0
+        if not self.live_workers() and not local_slots: return {}
+        job = next(self.job_ids)
+        results = queue.Queue()
+        self.jobs[job] = {"args": args, "results": results}
+        for idx, seed, n in chunks:
+            self.tasks.put({"type": "chunk", "job": job, "chunk": idx, "seed": seed, "n": n})
+        active = threading.Event(); active.set()
+        for _ in range(local_slots):
+            threading.Thread(target=self._local, args=(executor, active), daemon=True).start()
+        done, lost = {}, set()
+        deadline = time.monotonic() + self.job_timeout
+        try:
+            while len(done) + len(lost) < len(chunks) and time.monotonic() < deadline:
+                try: idx, kind, res = results.get(timeout=0.5)
+                except queue.Empty:
+                    if not local_slots and not self.live_workers(): break
+                    continue
+                if kind == "error": raise ChunkError(f"Chunk {idx} : {res}")
+                if kind == "lost": lost.add(idx)
+                else: done[idx] = res
+        finally:
+            # Les chunks restants de ce job seront ignorés par les consommateurs
+            active.clear()
+            del self.jobs[job]
+        return done
+
+    def close(self):
+        self.closed = True
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+        self.sock.close()
+        for _ in range(self.live_workers()): self.tasks.put(None)
+
+# --- WORKER ---
+def run_worker(host, port, token=None, retry=2.0):
+    """Boucle d'un worker : se (re)connecte au coordinateur et exécute les chunks reçus.
+    Lève WorkerRejected si le coordinateur refuse le token."""
+    token = token if token is not None else os.environ.get("DND_CLUSTER_TOKEN", "")
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+        except OSError:
+            if not retry: raise
+            time.sleep(retry); continue
+        f = sock.makefile("rwb")
+        jobs = {}
+        try:
+            send_msg(f, {"type": "hello", "pid": os.getpid(), "token": token})
+            while True:
+                msg = recv_msg(f)
+                kind = msg.get("type")
+                if kind == "rejected":
+                    raise WorkerRejected(msg.get("reason", "refusé"))
+                if kind == "job":
+                    pj, mon, actions = msg["args"]
+                    # JSON transforme les clés int en str : on les restaure pour EntiteCombat
+                    jobs[msg["job"]] = (pj, mon, {int(k): v for k, v in actions.items()})
+                elif kind == "forget":
+                    jobs.pop(msg["job"], None)
+                elif kind == "chunk":
+                    try:
+                        res = run_chunk(((msg["chunk"], msg["seed"], msg["n"]), jobs[msg["job"]]))
+                        reply = {"type": "result", "job": msg["job"], "chunk": msg["chunk"], "result": res}
+                    except Exception as e:
+                        # Erreur de calcul : on la remonte, la connexion reste valide
+                        reply = {"type": "error", "job": msg["job"], "chunk": msg["chunk"], "error": f"{type(e).__name__}: {e}"}
+                    send_msg(f, reply)
+        except (OSError, ValueError):
+            pass
+        finally:
+            sock.close()
+        if not retry: return
+        time.sleep(retry)
+
+def worker_cli(host, port):
+    try: run_worker(host, port)
+    except WorkerRejected as e:
+        sys.exit(f"Worker refusé par le coordinateur {host}:{port} : {e} (vérifier DND_CLUSTER_TOKEN)")
+
+def parse_addr(addr: str):
+    host, _, port = addr.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cluster")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="Exécute des chunks de simulation pour un coordinateur")
+    w.add_argument("--connect", required=True, help="host:port du coordinateur (DND_COORDINATOR côté serveur)")
+    w.add_argument("--procs", type=int, default=1, help="Nombre de processus worker à lancer")
+    opts = parser.parse_args(argv)
+
+    host, port = parse_addr(opts.connect)
+    if opts.procs <= 1:
+        worker_cli(host, port); return
+    from multiprocessing import Process
+    procs = [Process(target=worker_cli, args=(host, port)) for _ in range(opts.procs)]
+    for p in procs: p.start()
+    try:
+        for p in procs: p.join()
+    except KeyboardInterrupt:
+        for p in procs: p.terminate()
+    sys.exit(max((p.exitcode or 0) for p in procs))
+
+if __name__ == "__main__":
+    try: main()
+    except KeyboardInterrupt: sys.exit(0)
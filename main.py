@@ -295,80 +295,25 @@ class ActionModel(BaseModel):
     id: Optional[int] = None
     nom: str
     formule: str
-import time, random, asyncio, sqlite3, re, json
-from math import floor
-from concurrent.futures import ProcessPoolExecutor
-from fastapi import FastAPI
+import os, time, random, asyncio, sqlite3, re, json, base64, logging
+from contextlib import asynccontextmanager
+from cluster import Coordinator, parse_addr
+from simulation import make_chunks, referenced_actions, run_chunks
+from fastapi import FastAPI, HTTPException
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from functools import lru_cache
 
-app = FastAPI()
-DB_NAME = "dnd_database.db"
+log = logging.getLogger(__name__)
 
-# --- 1. OPTIMISATION : PARSING DES DÉS AVEC CACHE ---
-# On décompose le texte UNE fois, on garde le résultat en RAM.
-@lru_cache(maxsize=1024)
-def parse_dice_string(dice_str: str):
-    """Transforme '2d6+4' en tuple (nb_des, faces, bonus)"""
-    if not dice_str: return (0, 0, 0)
-    s = str(dice_str).lower().replace(" ", "")
-    if 'd' not in s:
-        try: return (0, 0, int(s))
-        except: return (0, 0, 0)
-    
-    nb_dice = 0
-    faces = 0
-    bonus = 0
-    
-    parts = re.split(r'([+-])', s)
-    sign = 1
-    for p in parts:
-        if p == '+': sign = 1
-        elif p == '-': sign = -1
-        elif 'd' in p:
-            try:
-                n_str, f_str = p.split('d')
-                n = int(n_str) if n_str else 1
-                f = int(f_str)
-                # On ne gère ici que l'addition simple de dés, 
-                # pour des formules complexes, on simplifie
-                nb_dice += n * sign # Attention: gestion simplifiée
-                faces = f 
-            except: pass
-        elif p.isdigit():
-            bonus += int(p) * sign
-            
-    return (nb_dice, faces, bonus)
+@asynccontextmanager
+async def lifespan(app):
+    start_coordinator()
+    yield
+    stop_coordinator()
 
-def roll_fast(dice_data):
-    """Exécute le jet à partir des données pré-parsées"""
-    n, f, b = dice_data
-    if n == 0: return b
-    # Optimisation mathématique : random.choices est parfois plus lent que la boucle simple sur petits nombres
-    # Sur gros volume, sum(random.randint) reste très correct en Python pur
-    return sum(random.randint(1, f) for _ in range(n)) + b
-
-def roll_d20_fast(adv: int):
-    """ 1=Adv, -1=Disadv, 0=Normal """
-    r1 = random.randint(1, 20)
-    if adv == 0: return r1, False
-    r2 = random.randint(1, 20)
-    if adv == 1: return (r1 if r1 > r2 else r2), True
-    return (r1 if r1 < r2 else r2), True
-
-# --- 2. TABLES DE PROGRESSION (Pre-computed) ---
-FULL_CASTER = [[2,0,0,0,0],[3,0,0,0,0],[4,2,0,0,0],[4,3,0,0,0],[4,3,2,0,0],[4,3,3,0,0],[4,3,3,1,0],[4,3,3,2,0],[4,3,3,3,1],[4,3,3,3,2]]
-HALF_CASTER = [[0,0,0,0,0],[2,0,0,0,0],[3,0,0,0,0],[3,0,0,0,0],[4,2,0,0,0],[4,2,0,0,0],[4,3,0,0,0],[4,3,0,0,0],[4,3,2,0,0],[4,3,2,0,0]]
-
-def get_slots(classe, level):
-    idx = min(level, 10) - 1
-    if idx < 0: return [0]*5
-    if classe in ["Mage", "Clerc", "Druide", "Barde", "Ensorceleur"]: return list(FULL_CASTER[idx])
-    if classe in ["Paladin", "Rôdeur"]: return list(HALF_CASTER[idx])
-    if classe == "Sorcier": return [0,0,2,0,0] if level >= 5 else [0,2,0,0,0]
-    return [0]*5
+app = FastAPI(lifespan=lifespan)
+DB_NAME = "dnd_database.db"
 
 # --- DB INIT ---
 def init_db():
@@ -389,6 +334,33 @@ def init_db():
         force INTEGER, dexterite INTEGER, constitution INTEGER, intelligence INTEGER, sagesse INTEGER, charisme INTEGER,
         hp_max INTEGER, ac INTEGER, actions_ids TEXT, features TEXT, position TEXT, behavior TEXT
     )''')
+
+    # INDEX CATALOGUE : couvrent les filtres + l'ordre de tri utilisé par la pagination par curseur.
+    # Tri sur IFNULL(...) : une ligne NULL (import, saisie directe) reste comparable pour le curseur.
+    for old_idx in ("idx_actions_order", "idx_actions_type", "idx_combattants_type", "idx_combattants_classe"):
+        c.execute(f"DROP INDEX IF EXISTS {old_idx}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actions_sort ON actions (IFNULL(level, 0), IFNULL(nom, ''), id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actions_type_sort ON actions (type_action, IFNULL(level, 0), IFNULL(nom, ''), id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_combattants_type_sort ON combattants (type_entite, IFNULL(niveau, 0), IFNULL(nom, ''), id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_combattants_classe_sort ON combattants (type_entite, classe, IFNULL(niveau, 0), IFNULL(nom, ''), id)")
+
+    # RECHERCHE PLEIN TEXTE (FTS5) : tables externes synchronisées par triggers
+    for table, fts, cols in (("actions", "actions_fts", ("nom", "formule_degats")),
+                             ("combattants", "combattants_fts", ("nom", "classe"))):
+        existed = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)).fetchone()
+        col_list = ", ".join(cols)
+        new_vals = ", ".join("new." + k for k in cols)
+        old_vals = ", ".join("old." + k for k in cols)
+        c.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({col_list}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals}); END""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals}); END""")
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_vals});
+            INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_vals}); END""")
+        # Base existante : on indexe les lignes déjà présentes une seule fois
+        if not existed: c.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
     conn.commit(); conn.close()
 init_db()
 
@@ -410,6 +382,7 @@ class FighterModel(BaseModel):
 
 class SimuRequest(BaseModel):
     iterations: int; pj_ids: List[int]; monstre_ids: List[int]
+    seed: Optional[int] = None  # Même graine => même résultat (local ou cluster)
 
 @app.post("/api/action/save")
 def save_action(a: ActionModel):
@@ -434,162 +407,6 @@ def save_fighter(f: FighterModel):
         (f.nom, f.type_entite, f.classe, f.niveau, f.stats['str'], f.stats['dex'], f.stats['con'], f.stats['int'], f.stats['wis'], f.stats['cha'], f.hp_max, f.ac, act_j, ft_j, f.position, f.behavior))
     conn.commit(); conn.close(); return "ok"
 
-# --- LOGIQUE SIMULATION ---
-class EntiteCombat:
-    __slots__ = ('id', 'nom', 'team', 'classe', 'lvl', 'stats', 'mods', 'hp', 'hp_max', 'base_ac', 
-                 'actions', 'feats', 'position', 'behavior', 'prof', 'slots', 'effects', 
-                 'concentrating_on', 'init_bonus', 'total_dmg_done', 'init', 'use_gwm', 
-                 'nb_attacks', 'state', 'death_saves_success', 'death_saves_fail', 'vex_target_id',
-                 'damage_taken', 'healing_done', 'crits_dealt', 'misses', 'kills', 'times_downed')
-
-    def __init__(self, data, actions_map):
-        self.id = data['id']
-        self.nom = data['nom']
-        self.team = data['type_entite'] # PJ ou MONSTRE
-        self.classe = data['classe']
-        self.lvl = data['niveau']
-        self.stats = {
-            'str': data['force'], 'dex': data['dexterite'], 'con': data['constitution'],
-            'int': data['intelligence'], 'wis': data['sagesse'], 'cha': data['charisme']
-        }
-        self.mods = {k: floor((v - 10) / 2) for k, v in self.stats.items()}
-        self.hp_max = data['hp_max']
-        self.hp = self.hp_max
-        self.base_ac = data['ac']
-        self.actions = []
-        if data['actions_ids']:
-            ids = json.loads(data['actions_ids'])
-            for i in ids:
-                if i in actions_map: self.actions.append(actions_map[i])
-        
-        self.feats = json.loads(data['features']) if data['features'] else []
-        self.position = data['position']
-        self.behavior = data['behavior']
-        
-        self.prof = 2 + floor((self.lvl - 1) / 4)
-        self.slots = get_slots(self.classe, self.lvl)
-        self.effects = []
-        self.concentrating_on = None
-        self.init_bonus = self.mods['dex']
-        if 'Initiative' in self.feats: self.init_bonus += 5
-        
-        self.total_dmg_done = 0
-        self.damage_taken = 0
-        self.healing_done = 0
-        self.crits_dealt = 0
-        self.misses = 0
-        self.kills = 0
-        self.times_downed = 0
-        self.init = 0
-        self.use_gwm = False
-        self.nb_attacks = 1
-        if self.lvl >= 5 and self.classe in ['Guerrier', 'Paladin', 'Rôdeur', 'Barbare']: self.nb_attacks = 2
-        if self.lvl >= 11 and self.classe == 'Guerrier': self.nb_attacks = 3
-        
-        self.state = "normal" # normal, prone, stunned, etc.
-        self.death_saves_success = 0
-        self.death_saves_fail = 0
-        self.vex_target_id = None
-
-    @property
-    def ac(self):
-        base = self.base_ac
-        # Shield spell logic could go here if tracked
-        return base
-
-    def roll_init(self):
-        r, _ = roll_d20_fast(0)
-        self.init = r + self.init_bonus
-
-def simuler_bataille(args):
-    pj_data, mon_data, actions_map = args
-    tous = [EntiteCombat(p, actions_map) for p in pj_data] + [EntiteCombat(m, actions_map) for m in mon_data]
-    
-    for c in tous: c.roll_init()
-    tous.sort(key=lambda x: x.init, reverse=True)
-    
-    rounds = 0
-    log = []
-    
-    while rounds < 20: # Limit rounds to prevent infinite loops
-        rounds += 1
-        pj_alive = [c for c in tous if c.team == 'PJ' and c.hp > 0]
-        mon_alive = [c for c in tous if c.team == 'MONSTRE' and c.hp > 0]
-        
-        if not pj_alive or not mon_alive: break
-        
-        for actor in tous:
-            if actor.hp <= 0: continue
-            
-            # Simple AI: Attack random enemy
-            enemies = [e for e in tous if e.team != actor.team and e.hp > 0]
-            if not enemies: break
-            
-            target = random.choice(enemies)
-            
-            # Choose action (simple: first available attack)
-            action = None
-            for a in actor.actions:
-                if a['type_action'] == 'attaque':
-                    action = a
-                    break
-            
-            if action:
-                # Attack Roll
-                adv = 0
-                d20, is_crit = roll_d20_fast(adv)
-                att_bonus = actor.mods['str'] + actor.prof # Simplified
-                
-                hit = False
-                crit = (d20 == 20)
-                
-                if crit or (d20 + att_bonus >= target.ac):
-                    hit = True
-                    if crit: actor.crits_dealt += 1
-                    
-                    # Damage Roll
-                    dice_data = parse_dice_string(action['formule_degats'])
-                    dmg = roll_fast(dice_data) + actor.mods['str']
-                    if crit: dmg += roll_fast(dice_data) # Crit adds dice
-                    
-                    target.hp -= dmg
-                    target.damage_taken += dmg
-                    actor.total_dmg_done += dmg
-                    
-                    if target.hp <= 0:
-                        actor.kills += 1
-                        target.times_downed += 1
-                    
-                    log.append(f"Round {rounds}: {actor.nom} attaque {target.nom} et inflige {dmg} dégâts.")
-                else:
-                    actor.misses += 1
-                    log.append(f"Round {rounds}: {actor.nom} rate {target.nom}.")
-            else:
-                 log.append(f"Round {rounds}: {actor.nom} ne fait rien.")
-
-    victoire = any(p.hp > 0 for p in tous if p.team == 'PJ') and not any(m.hp > 0 for m in tous if m.team == 'MONSTRE')
-    
-    return {
-        "victoire_pj": victoire,
-        "rounds": rounds,
-        "morts": sum(1 for p in tous if p.team == 'PJ' and p.hp <= 0),
-        "log": log,
-        "dmg": {a.nom: a.total_dmg_done for a in tous if a.team == 'PJ'},
-        "fighter_stats": {
-            f.nom: {
-                "hp_remaining": max(0, f.hp),
-                "survived": 1 if f.hp > 0 else 0,
-                "dmg_done": f.total_dmg_done,
-                "dmg_taken": f.damage_taken,
-                "healing_done": f.healing_done,
-                "crits_dealt": f.crits_dealt,
-                "misses": f.misses,
-                "kills": f.kills,
-                "times_downed": f.times_downed
-            } for f in tous
-        }
-    }
-
 def process_parallel(payload: SimuRequest):
     conn = sqlite3.connect(DB_NAME); conn.row_factory = sqlite3.Row
     pj_rows = [dict(r) for r in conn.execute(f"SELECT * FROM combattants WHERE id IN ({','.join(map(str, payload.pj_ids))})").fetchall()]
@@ -611,44 +428,14 @@ def process_parallel(payload: SimuRequest):
         for row in mon_rows:
             if row['id'] == mid: final_mon.append(row); break
             
-    args = (final_pj, final_mon, actions)
-    
-    with ProcessPoolExecutor() as executor:
-        results = list(executor.map(simuler_bataille, [args] * payload.iterations))
-        
-    # Aggregation
-    total_dmg = {}
-    wins = 0
-    tot_rounds = 0
-    agg_stats = {}
-    
-    sample = results[0] if results else {}
-    
-    for r in results:
-        if r['victoire_pj']: wins += 1
-        tot_rounds += r['rounds']
-        if 'dmg' in r:
-            for k, v in r['dmg'].items():
-                total_dmg[k] = total_dmg.get(k, 0) + v
-        
-        if 'fighter_stats' in r:
-            for nom, s in r['fighter_stats'].items():
-                if nom not in agg_stats:
-                    agg_stats[nom] = {"hp_remaining":0, "survived":0, "dmg_done":0, "dmg_taken":0, "healing_done":0, "crits_dealt":0, "misses":0, "kills":0, "times_downed":0}
-                agg_stats[nom]["hp_remaining"] += s["hp_remaining"]
-                agg_stats[nom]["survived"] += s["survived"]
-                agg_stats[nom]["dmg_done"] += s["dmg_done"]
-                agg_stats[nom]["dmg_taken"] += s["dmg_taken"]
-                agg_stats[nom]["healing_done"] += s["healing_done"]
-                agg_stats[nom]["crits_dealt"] += s["crits_dealt"]
-                agg_stats[nom]["misses"] += s["misses"]
-                agg_stats[nom]["kills"] += s["kills"]
-                agg_stats[nom]["times_downed"] += s["times_downed"]
+    args = (final_pj, final_mon, referenced_actions(final_pj + final_mon, actions))
+    seed = payload.seed if payload.seed is not None else random.randrange(2**32)
+    agg = run_chunks(make_chunks(payload.iterations, seed), args, coordinator)
 
     N = payload.iterations if payload.iterations > 0 else 1
     
     final_stats = {}
-    for nom, s in agg_stats.items():
+    for nom, s in agg["stats"].items():
         final_stats[nom] = {
             "avg_hp": int(s["hp_remaining"] / N),
             "survival_rate": int((s["survived"] / N) * 100),
@@ -662,22 +449,112 @@ def process_parallel(payload: SimuRequest):
         }
 
     return {
-        "win_rate": (wins / N) * 100,
-        "avg_rounds": tot_rounds / N,
-        "sample_log": sample.get('log', []),
-        "dmg_distribution": {k: int(v/N) for k,v in total_dmg.items()},
-        "detailed_stats": final_stats
+        "win_rate": (agg["wins"] / N) * 100,
+        "avg_rounds": agg["rounds"] / N,
+        "sample_log": agg["sample_log"] or [],
+        "dmg_distribution": {k: int(v/N) for k,v in agg["dmg"].items()},
+        "detailed_stats": final_stats,
+        "seed": seed
     }
 
+# --- CATALOGUE : RECHERCHE INDEXÉE + PAGINATION PAR CURSEUR ---
+# Les listes ne renvoient jamais tout le catalogue : une page bornée, triée sur un index,
+# avec uniquement les colonnes utiles aux sélecteurs (view="full" pour les écrans d'édition).
+PAGE_DEFAULT = 50
+PAGE_MAX = 200
+# Clés de tri : (colonne, valeur si NULL) ; doivent correspondre aux index IFNULL de init_db
+CATALOGS = {
+    "actions": {"fts": "actions_fts", "order": (("level", 0), ("nom", ""), ("id", None)),
+                "picker": ("id", "nom", "formule_degats", "type_action", "level")},
+    "combattants": {"fts": "combattants_fts", "order": (("niveau", 0), ("nom", ""), ("id", None)),
+                    "picker": ("id", "nom", "classe", "niveau", "hp_max", "ac")},
+}
+
+def sort_expr(col, default):
+    if default is None: return col
+    return f"IFNULL({col}, {default!r})"
+
+def fts_query(q: Optional[str]):
+    """Transforme la saisie utilisateur en requête FTS5 sûre : 'boule feu' -> '"boule"* "feu"*'"""
+    if not q: return None
+    tokens = re.findall(r"\w+", q)
+    return " ".join(f'"{t}"*' for t in tokens) or None
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if (isinstance(values, list) and len(values) == 3
+                and type(values[0]) is int and type(values[1]) is str and type(values[2]) is int):
+            return values
+    except: pass
+    raise HTTPException(status_code=400, detail="Curseur invalide")
+
+def search_catalog(table, filters: dict, q=None, cursor=None, limit=PAGE_DEFAULT, view="picker", ids=None):
+    """Page de résultats : {"items": [...], "next_cursor": str|None}"""
+    cfg = CATALOGS[table]
+    order = ", ".join(sort_expr(col, default) for col, default in cfg["order"])
+    cols = "*" if view == "full" else ", ".join(cfg["picker"])
+    clauses, params = [], []
+    for col, val in filters.items():
+        if val is not None: clauses.append(f"{col}=?"); params.append(val)
+    if ids:
+        clauses.append(f"id IN ({','.join('?' * len(ids))})"); params.extend(ids)
+    match = fts_query(q)
+    if match:
+        clauses.append(f"id IN (SELECT rowid FROM {cfg['fts']} WHERE {cfg['fts']} MATCH ?)"); params.append(match)
+    if cursor:
+        # Keyset : on reprend juste après la dernière ligne vue, sans OFFSET
+        # (le premier terme seul permet à SQLite de positionner l'index sur une expression IFNULL)
+        values = decode_cursor(cursor)
+        clauses.append(f"{sort_expr(*cfg['order'][0])} >= ?"); params.append(values[0])
+        clauses.append(f"({order}) > (?, ?, ?)"); params.extend(values)
+    limit = max(1, min(limit, PAGE_MAX))
+    sql = f"SELECT {cols} FROM {table}"
+    if clauses: sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {order} LIMIT ?"
+
+    conn = sqlite3.connect(DB_NAME); conn.row_factory = sqlite3.Row
+    rows = [dict(r) for r in conn.execute(sql, params + [limit + 1]).fetchall()]
+    conn.close()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([default if last[col] is None else last[col] for col, default in cfg["order"]])
+    return {"items": rows, "next_cursor": next_cursor}
+
 @app.get("/api/action/list")
-def list_actions():
-    conn=sqlite3.connect(DB_NAME); conn.row_factory=sqlite3.Row
-    return [dict(r) for r in conn.execute("SELECT * FROM actions ORDER BY level, nom").fetchall()]
+def list_actions(q: Optional[str] = None, type_action: Optional[str] = None, level: Optional[int] = None,
+                 ids: Optional[str] = None, cursor: Optional[str] = None, limit: int = PAGE_DEFAULT, view: str = "picker"):
+    id_list = [int(i) for i in ids.split(",") if i.strip().isdigit()] if ids else None
+    if id_list and len(id_list) > PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"Trop d'ids (max {PAGE_MAX})")
+    return search_catalog("actions", {"type_action": type_action, "level": level}, q, cursor, limit, view, id_list)
 
 @app.get("/api/fighter/list")
-def list_fighters(type: str):
-    conn=sqlite3.connect(DB_NAME); conn.row_factory=sqlite3.Row
-    return [dict(r) for r in conn.execute("SELECT * FROM combattants WHERE type_entite=?", (type,)).fetchall()]
+def list_fighters(type: str, q: Optional[str] = None, classe: Optional[str] = None, niveau: Optional[int] = None,
+                  cursor: Optional[str] = None, limit: int = PAGE_DEFAULT, view: str = "picker"):
+    return search_catalog("combattants", {"type_entite": type, "classe": classe, "niveau": niveau}, q, cursor, limit, view)
+
+# --- CLUSTER (optionnel) ---
+# DND_COORDINATOR=0.0.0.0:9100 (+ DND_CLUSTER_TOKEN hors localhost) => le serveur écoute les workers
+# (`python -m cluster worker --connect host:9100`)
+coordinator = None
+
+def start_coordinator():
+    global coordinator
+    addr = os.environ.get("DND_COORDINATOR")
+    if not addr: return
+    try: coordinator = Coordinator(*parse_addr(addr))
+    except OSError as e:
+        # uvicorn --workers > 1 : un seul processus obtient le port, les autres simulent en local
+        log.warning("Coordinateur non démarré sur %s (%s) : simulation locale", addr, e)
+
+def stop_coordinator():
+    if coordinator: coordinator.close()
 
 @app.post("/api/simulate")
 async def run_sim(r: SimuRequest):
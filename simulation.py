@@ -0,0 +1,291 @@
+"""Cœur de la simulation : dés, combattants, batailles et agrégats par chunks.
+
+Aucun effet de bord à l'import (ni base, ni FastAPI) : utilisé par le serveur (main)
+comme par les workers distants (cluster).
+"""
+import os, random, re, json
+from math import ceil, floor
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# --- 1. OPTIMISATION : PARSING DES DÉS AVEC CACHE ---
+# On décompose le texte UNE fois, on garde le résultat en RAM.
+@lru_cache(maxsize=1024)
+def parse_dice_string(dice_str: str):
+    """Transforme '2d6+4' en tuple (nb_des, faces, bonus)"""
+    if not dice_str: return (0, 0, 0)
+    s = str(dice_str).lower().replace(" ", "")
+    if 'd' not in s:
+        try: return (0, 0, int(s))
+        except: return (0, 0, 0)
+    
+    nb_dice = 0
+    faces = 0
+    bonus = 0
+    
+    parts = re.split(r'([+-])', s)
+    sign = 1
+    for p in parts:
+        if p == '+': sign = 1
+        elif p == '-': sign = -1
+        elif 'd' in p:
+            try:
+                n_str, f_str = p.split('d')
+                n = int(n_str) if n_str else 1
+                f = int(f_str)
+                # On ne gère ici que l'addition simple de dés, 
+                # pour des formules complexes, on simplifie
+                nb_dice += n * sign # Attention: gestion simplifiée
+                faces = f 
+            except: pass
+        elif p.isdigit():
+            bonus += int(p) * sign
+            
+    return (nb_dice, faces, bonus)
+
+def roll_fast(dice_data):
+    """Exécute le jet à partir des données pré-parsées"""
+    n, f, b = dice_data
+    if n == 0: return b
+    # Optimisation mathématique : random.choices est parfois plus lent que la boucle simple sur petits nombres
+    # Sur gros volume, sum(random.randint) reste très correct en Python pur
+    return sum(random.randint(1, f) for _ in range(n)) + b
+
+def roll_d20_fast(adv: int):
+    """ 1=Adv, -1=Disadv, 0=Normal """
+    r1 = random.randint(1, 20)
+    if adv == 0: return r1, False
+    r2 = random.randint(1, 20)
+    if adv == 1: return (r1 if r1 > r2 else r2), True
+    return (r1 if r1 < r2 else r2), True
+
+# --- 2. TABLES DE PROGRESSION (Pre-computed) ---
+FULL_CASTER = [[2,0,0,0,0],[3,0,0,0,0],[4,2,0,0,0],[4,3,0,0,0],[4,3,2,0,0],[4,3,3,0,0],[4,3,3,1,0],[4,3,3,2,0],[4,3,3,3,1],[4,3,3,3,2]]
+HALF_CASTER = [[0,0,0,0,0],[2,0,0,0,0],[3,0,0,0,0],[3,0,0,0,0],[4,2,0,0,0],[4,2,0,0,0],[4,3,0,0,0],[4,3,0,0,0],[4,3,2,0,0],[4,3,2,0,0]]
+
+def get_slots(classe, level):
+    idx = min(level, 10) - 1
+    if idx < 0: return [0]*5
+    if classe in ["Mage", "Clerc", "Druide", "Barde", "Ensorceleur"]: return list(FULL_CASTER[idx])
+    if classe in ["Paladin", "Rôdeur"]: return list(HALF_CASTER[idx])
+    if classe == "Sorcier": return [0,0,2,0,0] if level >= 5 else [0,2,0,0,0]
+    return [0]*5
+
+# --- LOGIQUE SIMULATION ---
+class EntiteCombat:
+    __slots__ = ('id', 'nom', 'team', 'classe', 'lvl', 'stats', 'mods', 'hp', 'hp_max', 'base_ac', 
+                 'actions', 'feats', 'position', 'behavior', 'prof', 'slots', 'effects', 
+                 'concentrating_on', 'init_bonus', 'total_dmg_done', 'init', 'use_gwm', 
+                 'nb_attacks', 'state', 'death_saves_success', 'death_saves_fail', 'vex_target_id',
+                 'damage_taken', 'healing_done', 'crits_dealt', 'misses', 'kills', 'times_downed')
+
+    def __init__(self, data, actions_map):
+        self.id = data['id']
+        self.nom = data['nom']
+        self.team = data['type_entite'] # PJ ou MONSTRE
+        self.classe = data['classe']
+        self.lvl = data['niveau']
+        self.stats = {
+            'str': data['force'], 'dex': data['dexterite'], 'con': data['constitution'],
+            'int': data['intelligence'], 'wis': data['sagesse'], 'cha': data['charisme']
+        }
+        self.mods = {k: floor((v - 10) / 2) for k, v in self.stats.items()}
+        self.hp_max = data['hp_max']
+        self.hp = self.hp_max
+        self.base_ac = data['ac']
+        self.actions = []
+        if data['actions_ids']:
+            ids = json.loads(data['actions_ids'])
+            for i in ids:
+                if i in actions_map: self.actions.append(actions_map[i])
+        
+        self.feats = json.loads(data['features']) if data['features'] else []
+        self.position = data['position']
+        self.behavior = data['behavior']
+        
+        self.prof = 2 + floor((self.lvl - 1) / 4)
+        self.slots = get_slots(self.classe, self.lvl)
+        self.effects = []
+        self.concentrating_on = None
+        self.init_bonus = self.mods['dex']
+        if 'Initiative' in self.feats: self.init_bonus += 5
+        
+        self.total_dmg_done = 0
+        self.damage_taken = 0
+        self.healing_done = 0
+        self.crits_dealt = 0
+        self.misses = 0
+        self.kills = 0
+        self.times_downed = 0
+        self.init = 0
+        self.use_gwm = False
+        self.nb_attacks = 1
+        if self.lvl >= 5 and self.classe in ['Guerrier', 'Paladin', 'Rôdeur', 'Barbare']: self.nb_attacks = 2
+        if self.lvl >= 11 and self.classe == 'Guerrier': self.nb_attacks = 3
+        
+        self.state = "normal" # normal, prone, stunned, etc.
+        self.death_saves_success = 0
+        self.death_saves_fail = 0
+        self.vex_target_id = None
+
+    @property
+    def ac(self):
+        base = self.base_ac
+        # Shield spell logic could go here if tracked
+        return base
+
+    def roll_init(self):
+        r, _ = roll_d20_fast(0)
+        self.init = r + self.init_bonus
+
+def simuler_bataille(args):
+    pj_data, mon_data, actions_map = args
+    tous = [EntiteCombat(p, actions_map) for p in pj_data] + [EntiteCombat(m, actions_map) for m in mon_data]
+    
+    for c in tous: c.roll_init()
+    tous.sort(key=lambda x: x.init, reverse=True)
+    
+    rounds = 0
+    log = []
+    
+    while rounds < 20: # Limit rounds to prevent infinite loops
+        rounds += 1
+        pj_alive = [c for c in tous if c.team == 'PJ' and c.hp > 0]
+        mon_alive = [c for c in tous if c.team == 'MONSTRE' and c.hp > 0]
+        
+        if not pj_alive or not mon_alive: break
+        
+        for actor in tous:
+            if actor.hp <= 0: continue
+            
+            # Simple AI: Attack random enemy
+            enemies = [e for e in tous if e.team != actor.team and e.hp > 0]
+            if not enemies: break
+            
+            target = random.choice(enemies)
+            
+            # Choose action (simple: first available attack)
+            action = None
+            for a in actor.actions:
+                if a['type_action'] == 'attaque':
+                    action = a
+                    break
+            
+            if action:
+                # Attack Roll
+                adv = 0
+                d20, is_crit = roll_d20_fast(adv)
+                att_bonus = actor.mods['str'] + actor.prof # Simplified
+                
+                hit = False
+                crit = (d20 == 20)
+                
+                if crit or (d20 + att_bonus >= target.ac):
+                    hit = True
+                    if crit: actor.crits_dealt += 1
+                    
+                    # Damage Roll
+                    dice_data = parse_dice_string(action['formule_degats'])
+                    dmg = roll_fast(dice_data) + actor.mods['str']
+                    if crit: dmg += roll_fast(dice_data) # Crit adds dice
+                    
+                    target.hp -= dmg
+                    target.damage_taken += dmg
+                    actor.total_dmg_done += dmg
+                    
+                    if target.hp <= 0:
+                        actor.kills += 1
+                        target.times_downed += 1
+                    
+                    log.append(f"Round {rounds}: {actor.nom} attaque {target.nom} et inflige {dmg} dégâts.")
+                else:
+                    actor.misses += 1
+                    log.append(f"Round {rounds}: {actor.nom} rate {target.nom}.")
+            else:
+                 log.append(f"Round {rounds}: {actor.nom} ne fait rien.")
+
+    victoire = any(p.hp > 0 for p in tous if p.team == 'PJ') and not any(m.hp > 0 for m in tous if m.team == 'MONSTRE')
+    
+    return {
+        "victoire_pj": victoire,
+        "rounds": rounds,
+        "morts": sum(1 for p in tous if p.team == 'PJ' and p.hp <= 0),
+        "log": log,
+        "dmg": {a.nom: a.total_dmg_done for a in tous if a.team == 'PJ'},
+        "fighter_stats": {
+            f.nom: {
+                "hp_remaining": max(0, f.hp),
+                "survived": 1 if f.hp > 0 else 0,
+                "dmg_done": f.total_dmg_done,
+                "dmg_taken": f.damage_taken,
+                "healing_done": f.healing_done,
+                "crits_dealt": f.crits_dealt,
+                "misses": f.misses,
+                "kills": f.kills,
+                "times_downed": f.times_downed
+            } for f in tous
+        }
+    }
+
+# --- AGRÉGATION PAR CHUNKS ---
+# Une simulation = N itérations découpées en ~CHUNK_COUNT chunks, chacun avec sa propre graine.
+# Le découpage ne dépend que de N (ni des cœurs, ni des workers) : à graine égale, le résultat
+# est identique en local (ProcessPool) comme sur le cluster, et il y a assez de chunks pour
+# occuper tous les cœurs / workers disponibles.
+CHUNK_COUNT = 256
+STAT_KEYS = ("hp_remaining", "survived", "dmg_done", "dmg_taken", "healing_done", "crits_dealt", "misses", "kills", "times_downed")
+
+def make_chunks(iterations: int, seed: int):
+    """[(idx, seed, n), ...] couvrant toutes les itérations"""
+    size = max(1, ceil(iterations / CHUNK_COUNT))
+    return [(i, seed, min(size, iterations - start)) for i, start in enumerate(range(0, max(iterations, 0), size))]
+
+def new_aggregate():
+    return {"wins": 0, "rounds": 0, "dmg": {}, "stats": {}, "sample_log": None}
+
+def accumulate(agg, r):
+    """Ajoute le résultat d'une bataille à un agrégat"""
+    if r['victoire_pj']: agg["wins"] += 1
+    agg["rounds"] += r['rounds']
+    for k, v in r.get('dmg', {}).items():
+        agg["dmg"][k] = agg["dmg"].get(k, 0) + v
+    for nom, st in r.get('fighter_stats', {}).items():
+        s = agg["stats"].setdefault(nom, dict.fromkeys(STAT_KEYS, 0))
+        for k in STAT_KEYS: s[k] += st[k]
+    if agg["sample_log"] is None: agg["sample_log"] = r.get('log', [])
+
+def merge_aggregates(agg, part):
+    """Fusionne un agrégat partiel (chunk) dans l'agrégat global"""
+    agg["wins"] += part["wins"]
+    agg["rounds"] += part["rounds"]
+    for k, v in part["dmg"].items():
+        agg["dmg"][k] = agg["dmg"].get(k, 0) + v
+    for nom, st in part["stats"].items():
+        s = agg["stats"].setdefault(nom, dict.fromkeys(STAT_KEYS, 0))
+        for k in STAT_KEYS: s[k] += st[k]
+    if agg["sample_log"] is None: agg["sample_log"] = part["sample_log"]
+
+def run_chunk(task):
+    """Exécute un chunk ((idx, seed, n), args) et renvoie son agrégat partiel (JSON-compatible)"""
+    (idx, seed, n), args = task
+    random.seed(f"{seed}:{idx}")
+    agg = new_aggregate()
+    for _ in range(n): accumulate(agg, simuler_bataille(args))
+    return agg
+
+def referenced_actions(fighters, actions):
+    """Sous-ensemble des actions réellement utilisées par les combattants (payload minimal)"""
+    ids = {i for f in fighters if f['actions_ids'] for i in json.loads(f['actions_ids'])}
+    return {k: v for k, v in actions.items() if k in ids}
+
+def run_chunks(chunks, args, coordinator=None):
+    """Agrégat global. Avec un coordinateur, les cœurs locaux et les workers distants consomment
+    la même file de chunks ; tout chunk non traité (plus de worker, délai) est fini en local."""
+    with ProcessPoolExecutor() as executor:
+        parts = coordinator.run(chunks, args, executor, os.cpu_count() or 1) if coordinator else {}
+        missing = [c for c in chunks if c[0] not in parts]
+        for c, part in zip(missing, executor.map(run_chunk, [(c, args) for c in missing])): parts[c[0]] = part
+    # Fusion dans l'ordre des chunks => sample_log déterministe
+    agg = new_aggregate()
+    for idx in sorted(parts): merge_aggregates(agg, parts[idx])
+    return agg
@@ -0,0 +1,110 @@
+import sys, json, base64, sqlite3
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    # main initialise sa base à l'import : on l'importe hors du dépôt, puis on pointe vers une base vide
+    monkeypatch.chdir(tmp_path)
+    import main
+    monkeypatch.setattr(main, "DB_NAME", str(tmp_path / "catalog.db"))
+    main.init_db()
+    return main, TestClient(main.app)
+
+def save_action(client, nom, formule="1d6", type_action="attaque", level=0):
+    client.post("/api/action/save", json={"nom": nom, "formule": formule, "type_action": type_action, "level": level})
+
+def save_fighter(client, nom, type_entite="MONSTRE", classe="Monstre", niveau=1):
+    stats = dict.fromkeys(("str", "dex", "con", "int", "wis", "cha"), 10)
+    client.post("/api/fighter/save", json={"nom": nom, "type_entite": type_entite, "classe": classe, "niveau": niveau,
+                                           "stats": stats, "hp_max": 10, "ac": 12, "actions_ids": [], "features": []})
+
+def all_pages(client, url, **params):
+    ids, cursor = [], None
+    while True:
+        r = client.get(url, params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        ids += [x["id"] for x in r["items"]]
+        cursor = r["next_cursor"]
+        if not cursor: return ids
+
+def names(client, url, **params):
+    return {x["nom"] for x in client.get(url, params=params).json()["items"]}
+
+def test_keyset_pagination_returns_every_row_once(api):
+    main, client = api
+    for i in range(20): save_action(client, f"Sort {i % 7}", level=i % 4)
+    # Lignes NULL insérées après le démarrage (import direct)
+    conn = sqlite3.connect(main.DB_NAME)
+    conn.executemany("INSERT INTO actions (nom, formule_degats, type_action, level) VALUES (?, '1d4', 'attaque', ?)",
+                     [("Zed", None), ("Aa", None), (None, None), ("Bb", 1)])
+    conn.commit(); conn.close()
+    ids = all_pages(client, "/api/action/list", limit=3)
+    assert len(ids) == len(set(ids)) == 24
+
+    for i in range(7): save_fighter(client, f"Gob {i}", niveau=i % 2)
+    save_fighter(client, "Héros", type_entite="PJ", classe="Guerrier")
+    assert len(all_pages(client, "/api/fighter/list", type="MONSTRE", limit=2)) == 7
+
+def test_fts_prefix_and_diacritics(api):
+    _, client = api
+    save_action(client, "Épée Longue", "1d8+4")
+    save_action(client, "Boule de feu", "8d6", "save", 3)
+    assert names(client, "/api/action/list", q="epee") == {"Épée Longue"}
+    assert names(client, "/api/action/list", q="lon") == {"Épée Longue"}
+    assert names(client, "/api/action/list", q="boul fe") == {"Boule de feu"}
+    assert names(client, "/api/action/list", q="8d6") == {"Boule de feu"}
+    assert names(client, "/api/action/list", q='"; DROP') == set()
+
+def test_fts_follows_update_and_delete(api):
+    main, client = api
+    save_action(client, "Trait de feu")
+    aid = client.get("/api/action/list").json()["items"][0]["id"]
+    client.post("/api/action/save", json={"id": aid, "nom": "Rayon de givre", "formule": "1d8", "type_action": "attaque"})
+    assert names(client, "/api/action/list", q="trait") == set()
+    assert names(client, "/api/action/list", q="givre") == {"Rayon de givre"}
+    conn = sqlite3.connect(main.DB_NAME)
+    conn.execute("DELETE FROM actions WHERE id=?", (aid,)); conn.commit(); conn.close()
+    assert names(client, "/api/action/list", q="givre") == set()
+
+def test_filters(api):
+    _, client = api
+    save_action(client, "Coup", type_action="attaque", level=0)
+    save_action(client, "Feu", type_action="save", level=3)
+    save_action(client, "Soin", type_action="soin", level=1)
+    assert names(client, "/api/action/list", type_action="save") == {"Feu"}
+    assert names(client, "/api/action/list", level=1) == {"Soin"}
+    save_fighter(client, "Aria", "PJ", "Mage", 3)
+    save_fighter(client, "Bran", "PJ", "Guerrier", 3)
+    save_fighter(client, "Gob", "MONSTRE", "Monstre", 3)
+    assert names(client, "/api/fighter/list", type="PJ", classe="Mage") == {"Aria"}
+    assert names(client, "/api/fighter/list", type="PJ", niveau=3) == {"Aria", "Bran"}
+    assert names(client, "/api/fighter/list", type="MONSTRE", q="gob") == {"Gob"}
+
+def test_picker_projection_and_full_view(api):
+    main, client = api
+    save_action(client, "Coup")
+    save_fighter(client, "Gob")
+    assert set(client.get("/api/action/list").json()["items"][0]) == set(main.CATALOGS["actions"]["picker"])
+    assert {"effect_json", "mastery", "save_stat"} <= set(client.get("/api/action/list", params={"view": "full"}).json()["items"][0])
+    assert set(client.get("/api/fighter/list", params={"type": "MONSTRE"}).json()["items"][0]) == set(main.CATALOGS["combattants"]["picker"])
+    assert "actions_ids" in client.get("/api/fighter/list", params={"type": "MONSTRE", "view": "full"}).json()["items"][0]
+
+@pytest.mark.parametrize("cursor", ["pas-du-base64", base64.urlsafe_b64encode(b"[1, 2]").decode(),
+                                    base64.urlsafe_b64encode(json.dumps([[1], 2, 3]).encode()).decode(),
+                                    base64.urlsafe_b64encode(json.dumps([0, None, 3]).encode()).decode()])
+def test_bad_cursor_is_400(api, cursor):
+    _, client = api
+    assert client.get("/api/action/list", params={"cursor": cursor}).status_code == 400
+
+def test_too_many_ids_is_400(api):
+    main, client = api
+    assert client.get("/api/action/list", params={"ids": ",".join(map(str, range(main.PAGE_MAX + 1)))}).status_code == 400
+    assert client.get("/api/action/list", params={"ids": "1,2"}).status_code == 200
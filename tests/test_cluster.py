@@ -0,0 +1,124 @@
+import os, sys, json, time, threading, subprocess
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from cluster import Coordinator, ChunkError
+from simulation import make_chunks, run_chunks, new_aggregate, merge_aggregates
+
+TOKEN = "test-token"
+
+def fighter(id, nom, team, actions_ids, hp=40, ac=12):
+    return {"id": id, "nom": nom, "type_entite": team, "classe": "Guerrier" if team == "PJ" else "Monstre", "niveau": 5,
+            "force": 16, "dexterite": 12, "constitution": 14, "intelligence": 10, "sagesse": 10, "charisme": 10,
+            "hp_max": hp, "ac": ac, "actions_ids": json.dumps(actions_ids), "features": "[]", "position": "front", "behavior": "random"}
+
+def action(id, formule):
+    return {"id": id, "nom": f"Attaque {id}", "formule_degats": formule, "type_action": "attaque", "level": 0,
+            "save_stat": None, "effect_json": None, "mastery": None}
+
+ARGS = ([fighter(1, "Héros", "PJ", [1])],
+        [fighter(2, "Gobelin", "MONSTRE", [2], hp=20), fighter(3, "Orque", "MONSTRE", [2], hp=25)],
+        {1: action(1, "1d8+3"), 2: action(2, "1d6+1")})
+# randint(1, 0) lève ValueError dès la première touche
+BROKEN_ARGS = (ARGS[0], ARGS[1], {1: action(1, "1d0"), 2: action(2, "1d0")})
+
+@pytest.fixture
+def coordinator():
+    coord = Coordinator("127.0.0.1", 0, token=TOKEN, chunk_timeout=10, job_timeout=60)
+    yield coord
+    coord.close()
+
+@pytest.fixture
+def start_workers(coordinator):
+    procs = []
+    def start(n):
+        env = dict(os.environ, DND_CLUSTER_TOKEN=TOKEN)
+        for _ in range(n):
+            procs.append(subprocess.Popen([sys.executable, "-m", "cluster", "worker", "--connect", f"127.0.0.1:{coordinator.address[1]}"],
+                                          cwd=ROOT, env=env))
+        deadline = time.monotonic() + 15
+        while coordinator.live_workers() < len(procs):
+            assert time.monotonic() < deadline, "les workers ne se sont pas connectés"
+            time.sleep(0.05)
+        return procs
+    yield start
+    for p in procs:
+        p.kill(); p.wait()
+
+def test_same_seed_same_result_with_0_1_n_workers(coordinator, start_workers):
+    chunks = make_chunks(3000, seed=42)
+    local = run_chunks(chunks, ARGS)
+    start_workers(1)
+    assert run_chunks(chunks, ARGS, coordinator) == local
+    start_workers(1)
+    assert coordinator.live_workers() == 2
+    assert run_chunks(chunks, ARGS, coordinator) == local
+
+def merged(parts):
+    agg = new_aggregate()
+    for idx in sorted(parts): merge_aggregates(agg, parts[idx])
+    return agg
+
+def wait_for(cond, timeout=15):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_killed_worker_chunks_are_redispatched(coordinator, start_workers):
+    chunks = make_chunks(20000, seed=7)
+    local = run_chunks(chunks, ARGS)
+    victim, _ = start_workers(2)
+    parts = {}
+    # Workers distants uniquement : tout chunk du worker tué doit passer par la file
+    runner = threading.Thread(target=lambda: parts.update(coordinator.run(chunks, ARGS)))
+    runner.start()
+    wait_for(lambda: coordinator.completed[victim.pid] >= 1)
+    victim.kill()
+    runner.join(timeout=60)
+    assert not runner.is_alive()
+    assert coordinator.requeued >= 1
+    assert len(parts) == len(chunks)
+    assert merged(parts) == local
+
+def test_local_cores_share_the_queue_with_workers(coordinator, start_workers):
+    chunks = make_chunks(5000, seed=11)
+    local = run_chunks(chunks, ARGS)
+    worker, = start_workers(1)
+    assert run_chunks(chunks, ARGS, coordinator) == local
+    assert coordinator.completed["local"] > 0
+    assert coordinator.completed[worker.pid] > 0
+
+def test_concurrent_jobs(coordinator, start_workers):
+    start_workers(2)
+    jobs = {seed: make_chunks(2000, seed) for seed in (1, 2, 3)}
+    expected = {seed: run_chunks(c, ARGS) for seed, c in jobs.items()}
+    got = {}
+    threads = [threading.Thread(target=lambda s=s, c=c: got.__setitem__(s, run_chunks(c, ARGS, coordinator))) for s, c in jobs.items()]
+    for t in threads: t.start()
+    for t in threads: t.join(timeout=60)
+    assert got == expected
+
+def test_failing_chunk_fails_fast(coordinator, start_workers):
+    start_workers(2)
+    t = time.monotonic()
+    with pytest.raises(ChunkError, match="ValueError"):
+        coordinator.run(make_chunks(1000, seed=1), BROKEN_ARGS)
+    assert time.monotonic() - t < 10
+    # Le coordinateur reste utilisable et les workers vivants
+    assert coordinator.live_workers() == 2
+    chunks = make_chunks(500, seed=3)
+    assert run_chunks(chunks, ARGS, coordinator) == run_chunks(chunks, ARGS)
+
+def test_worker_with_wrong_token_is_rejected(coordinator):
+    env = dict(os.environ, DND_CLUSTER_TOKEN="mauvais")
+    p = subprocess.run([sys.executable, "-m", "cluster", "worker", "--connect", f"127.0.0.1:{coordinator.address[1]}"],
+                       cwd=ROOT, env=env, capture_output=True, text=True, timeout=15)
+    assert p.returncode != 0
+    assert "refusé" in p.stderr and "token invalide" in p.stderr
+    assert coordinator.live_workers() == 0
+    assert coordinator.run(make_chunks(10, seed=1), ARGS) == {}